@@ -1,9 +1,33 @@
+import os
+
+# Thread pinning has to be configured before torch (and its OpenMP runtime) loads.
+# For multi-socket hosts also launch under: numactl --cpunodebind=0 --membind=0 python app.py
+# WORKERS is the number of gunicorn worker processes (see run_server.sh); with several
+# workers each one stays single-threaded to avoid oversubscribing the cores
+WORKERS = int(os.environ.get("WORKERS", "1"))
+os.environ.setdefault("OMP_NUM_THREADS", "1" if WORKERS > 1 else "4")  # Adjust based on your CPU cores
+os.environ.setdefault("MKL_NUM_THREADS", os.environ["OMP_NUM_THREADS"])
+if WORKERS == 1:
+    # Only let OpenMP pin a single process: under gunicorn --preload it binds the
+    # master's thread when torch loads and every forked worker would inherit that
+    # one-core mask. Multiple workers are pinned one per core by gunicorn.conf.py
+    os.environ.setdefault("KMP_AFFINITY", "granularity=fine,compact,1,0")
+    os.environ.setdefault("OMP_PROC_BIND", "TRUE")
+
 from fastapi import FastAPI, Request, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import torch
-import os
 import random
+import functools
+import gc
+import collections
+import contextlib
+import inspect
+import types
+import threading
+import time
+from concurrent.futures import Future
 import numpy as np
 from transformers import AutoModel, AutoTokenizer
 from pydantic import BaseModel
@@ -31,22 +55,85 @@ app.add_middleware(
 MODEL_NAME = "zhihan1996/DNABERT-2-117M"
 BASES = ['A', 'T', 'C', 'G']
 device = "cpu"
-torch.set_num_threads(4)  # Adjust based on your CPU cores
+torch.set_num_threads(int(os.environ["OMP_NUM_THREADS"]))
+try:
+    # Requests run one model call at a time, so inter-op parallelism only adds contention
+    torch.set_num_interop_threads(1)
+except RuntimeError as e:
+    print(f"Could not set inter-op threads: {e}")
+# Dynamic INT8 quantization of Linear layers; a win on VNNI-capable x86, can be slower elsewhere
+QUANTIZE_INT8 = os.environ.get("QUANTIZE_INT8", "0") == "1"
+# Compile the encoder with TorchInductor at startup (needs a working C++ toolchain)
+TORCH_COMPILE = os.environ.get("TORCH_COMPILE", "0") == "1"
+# Route DNABERT-2 attention through PyTorch's fused scaled_dot_product_attention
+USE_SDPA = os.environ.get("USE_SDPA", "1") == "1"
+# Shortlist alternate bases in input-embedding space and run the encoder on the winner only
+FAST_EDIT_SCORING = os.environ.get("FAST_EDIT_SCORING", "0") == "1"
+# Serve the encoder from an ONNX Runtime session built by export_onnx.py (e.g. dnabert2.int8.onnx)
+ONNX_MODEL_PATH = os.environ.get("ONNX_MODEL_PATH", "")
+# Run the encoder in BF16 when the CPU has native AVX512-BF16 support
+USE_BF16 = os.environ.get("USE_BF16", "0") == "1"
+# Apply Intel Extension for PyTorch weight prepacking and operator fusion (optional dependency)
+USE_IPEX = os.environ.get("USE_IPEX", "0") == "1"
+# Micro-batching of concurrent encoder calls; MAX_BATCH=1 runs every call directly
+MAX_BATCH = int(os.environ.get("MAX_BATCH", "16"))
+BATCH_TIMEOUT_MS = float(os.environ.get("BATCH_TIMEOUT_MS", "5"))
+# Serve unpadded batches from per-shape TorchScript traces, falling back to eager
+USE_TORCHSCRIPT = os.environ.get("USE_TORCHSCRIPT", "0") == "1"
+# Token counts traced at startup; real 20-nt inputs tokenize to 5-10 tokens
+TRACED_TOKEN_COUNTS = range(5, 11)
+# /predict takes 20-nt sequences; BPE emits at most one token per base plus [CLS]/[SEP]
+MAX_SEQUENCE_TOKENS = 20 + 2
 
 # Seed for reproducibility
 def set_seed(seed=42):
     torch.manual_seed(seed)
-    torch.cuda.manual_seed(seed)
     np.random.seed(seed)
     random.seed(seed)
-    torch.backends.cudnn.deterministic = True
-    torch.backends.cudnn.benchmark = False
+    # CPU-only server: don't touch CUDA or force cuDNN backend flags unless a GPU is present
+    if torch.cuda.is_available():
+        torch.cuda.manual_seed(seed)
 
 set_seed()
 
 # Load model and tokenizer
 print("Loading tokenizer...")
 tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, trust_remote_code=True)
+
+# Requests re-tokenize the same handful of 20-nt strings, so cache BPE output per
+# sequence and build batches from the cached ids
+@functools.lru_cache(maxsize=65536)
+def _tokenize(sequence):
+    if tokenizer.is_fast:
+        # Call the Rust tokenizer directly, skipping the Python wrapper's per-call
+        # dict/tensor/padding work; special tokens come from its post-processor.
+        # No truncation needed: /predict only accepts 20-nt sequences
+        return tuple(tokenizer.backend_tokenizer.encode(sequence).ids)
+    return tuple(tokenizer(sequence, truncation=True, max_length=512)["input_ids"])
+
+def tokenize_batch(sequences):
+    ids = [_tokenize(seq) for seq in sequences]
+    input_ids = np.full((len(ids), max(len(t) for t in ids)), tokenizer.pad_token_id, dtype=np.int64)
+    attention_mask = np.zeros(input_ids.shape, dtype=np.int64)
+    for row, token_ids in enumerate(ids):
+        input_ids[row, :len(token_ids)] = token_ids
+        attention_mask[row, :len(token_ids)] = 1
+    return {"input_ids": torch.from_numpy(input_ids), "attention_mask": torch.from_numpy(attention_mask)}
+
+def extract_hidden_states(outputs):
+    # Handle different output formats using the same approach as in run_dnabert.py
+    if isinstance(outputs, tuple):
+        return outputs[0]
+    elif hasattr(outputs, 'last_hidden_state'):
+        return outputs.last_hidden_state
+    return outputs
+
+def run_encoder(inputs):
+    # Single entry point for model forwards; always hands back FP32 hidden states
+    with torch.inference_mode(), torch.autocast(device_type="cpu", dtype=torch.bfloat16, enabled=use_bf16):
+        outputs = model(**inputs)
+    return extract_hidden_states(outputs).float()
+
 print("Loading model...")
 try:
     # Use our tested CPU-only configuration
@@ -88,73 +175,382 @@ print("Model loaded successfully!")
 model.eval()
 for param in model.parameters():
     param.requires_grad = False
+# Inference-only server: keep autograd off globally, not just inside model calls
+torch.set_grad_enabled(False)
+
+def _sdpa_unpad_attention_forward(self, hidden_states, cu_seqlens, max_seqlen_in_batch,
+                                  indices, attn_mask, bias):
+    # Same contract as DNABERT-2's BertUnpadSelfAttention.forward, but computes
+    # softmax(QK^T / sqrt(d) + bias) V in one fused SDPA call
+    layers_module = inspect.getmodule(type(self))
+    qkv = self.Wqkv(hidden_states)
+    qkv = layers_module.pad_input(qkv, indices, cu_seqlens.shape[0] - 1, max_seqlen_in_batch)
+    batch, seqlen, _ = qkv.shape
+    qkv = qkv.view(batch, seqlen, 3, self.num_attention_heads, self.attention_head_size)
+    q, k, v = qkv.permute(2, 0, 3, 1, 4).unbind(0)  # each: batch, heads, seqlen, head_dim
+    attention = torch.nn.functional.scaled_dot_product_attention(q, k, v, attn_mask=bias.to(q.dtype))
+    attention = attention.transpose(1, 2)  # batch, seqlen, heads, head_dim
+    # attn_mask is 1 for attend and 0 for don't
+    attention = layers_module.unpad_input_only(attention, torch.squeeze(attn_mask) == 1)
+    return attention.reshape(attention.shape[0], self.all_head_size)
+
+def enable_sdpa_attention(model):
+    # DNABERT-2 ships custom attention that optimum's BetterTransformer and
+    # attn_implementation="sdpa" don't recognise, so patch the modules directly
+    patched = 0
+    for module in model.modules():
+        if type(module).__name__ == "BertUnpadSelfAttention":
+            module.forward = types.MethodType(_sdpa_unpad_attention_forward, module)
+            patched += 1
+    return patched
+
+if USE_SDPA:
+    try:
+        patched = enable_sdpa_attention(model)
+        print(f"Using SDPA attention in {patched} layers")
+    except Exception as e:
+        print(f"Could not enable SDPA attention: {e}")
+
+def _index_first_axis(input, indices):
+    # Inference-only bert_padding.index_first_axis: plain row indexing
+    return input[indices]
+
+def _index_put_first_axis(values, indices, first_axis_dim):
+    # Inference-only bert_padding.index_put_first_axis: scatter rows into zeros
+    output = values.new_zeros((first_axis_dim, *values.shape[1:]))
+    output[indices] = values
+    return output
+
+def enable_plain_index_ops(model):
+    # DNABERT-2's unpad/pad helpers are custom torch.autograd.Functions, which
+    # torch.jit.trace can't record, so replace them with plain indexing in the
+    # modules that call them. Inference only: the replacements define no backward
+    layers_module = inspect.getmodule(type(model))
+    padding_module = inspect.getmodule(getattr(layers_module, "pad_input", None))
+    patched = 0
+    for module in {layers_module, padding_module} - {None}:
+        if hasattr(module, "index_first_axis"):
+            module.index_first_axis = _index_first_axis
+            module.index_put_first_axis = _index_put_first_axis
+            patched += 1
+    return patched
+
+class OnnxEncoder:
+    """Callable stand-in for the PyTorch encoder, backed by an ONNX Runtime session"""
+
+    def __init__(self, session, input_embeddings=None):
+        self.session = session
+        # FAST_EDIT_SCORING still reads the word-embedding table; nothing else of the
+        # PyTorch model is kept
+        self.input_embeddings = input_embeddings
+
+    def __call__(self, input_ids, attention_mask, **kwargs):
+        hidden_states = self.session.run(None, {
+            "input_ids": input_ids.numpy(),
+            "attention_mask": attention_mask.numpy(),
+        })[0]
+        return (torch.from_numpy(hidden_states),)
+
+    def get_input_embeddings(self):
+        return self.input_embeddings
+
+using_onnx = False
+if ONNX_MODEL_PATH:
+    try:
+        print(f"Loading ONNX model from {ONNX_MODEL_PATH}...")
+        import onnxruntime as ort
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.intra_op_num_threads = torch.get_num_threads()
+        session = ort.InferenceSession(ONNX_MODEL_PATH, sess_options, providers=["CPUExecutionProvider"])
+        model = OnnxEncoder(session, model.get_input_embeddings() if FAST_EDIT_SCORING else None)
+        using_onnx = True
+        # Free the PyTorch encoder's weights; the SDPA patch's bound methods form
+        # reference cycles, so collect explicitly rather than waiting for the GC
+        gc.collect()
+        print("ONNX Runtime session ready!")
+    except Exception as e:
+        print(f"ONNX Runtime unavailable, using PyTorch model: {e}")
+
+use_bf16 = False
+if USE_BF16 and not using_onnx and not QUANTIZE_INT8:
+    if hasattr(torch.cpu, "_is_avx512_bf16_supported") and torch.cpu._is_avx512_bf16_supported():
+        model = model.to(torch.bfloat16)
+        use_bf16 = True
+        print("Running model in BF16")
+    else:
+        print("CPU lacks AVX512-BF16 support, staying on FP32")
+
+if QUANTIZE_INT8 and not using_onnx:
+    try:
+        print("Applying dynamic INT8 quantization...")
+        import torch.ao.quantization as taq
+        if "fbgemm" in torch.backends.quantized.supported_engines:
+            torch.backends.quantized.engine = "fbgemm"
+        model = taq.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        print(f"Model quantized (engine: {torch.backends.quantized.engine})")
+    except Exception as e:
+        print(f"INT8 quantization failed, using FP32 model: {e}")
+
+if USE_IPEX and not using_onnx and not QUANTIZE_INT8:
+    try:
+        print("Optimizing model with Intel Extension for PyTorch...")
+        import intel_extension_for_pytorch as ipex
+        model = ipex.optimize(model, dtype=torch.bfloat16 if use_bf16 else torch.float32, level="O1")
+        print("IPEX optimization applied!")
+    except Exception as e:
+        print(f"IPEX optimization unavailable, using stock PyTorch: {e}")
+
+def warmup_inputs(batch_size, num_tokens):
+    # Unpadded [batch_size, num_tokens] encoder inputs for tracing and compile warmup
+    filler_id = _tokenize("ACGT" * 5)[1]
+    input_ids = torch.full((batch_size, num_tokens), filler_id, dtype=torch.int64)
+    input_ids[:, 0] = tokenizer.cls_token_id
+    input_ids[:, -1] = tokenizer.sep_token_id
+    return {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+
+class _HiddenStatesModule(torch.nn.Module):
+    """(input_ids, attention_mask) -> last hidden state, in a form torch.jit.trace accepts"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return extract_hidden_states(self.model(input_ids=input_ids, attention_mask=attention_mask))
+
+class TracedEncoder:
+    """Callable stand-in for the PyTorch encoder that reuses frozen TorchScript traces per input shape"""
+
+    def __init__(self, eager_model, shapes):
+        # Every trace is built here, at startup; tracing on the serving path would
+        # stall every request queued behind it
+        self.eager_model = eager_model
+        hidden_states_module = _HiddenStatesModule(eager_model)
+        self.traces = {}
+        for batch_size, num_tokens in shapes:
+            inputs = warmup_inputs(batch_size, num_tokens)
+            example = (inputs["input_ids"], inputs["attention_mask"])
+            traced = torch.jit.freeze(torch.jit.trace(hidden_states_module, example, strict=False).eval())
+            # TorchScript's profiling executor optimizes a graph over its first runs
+            for _ in range(2):
+                traced(*example)
+            self.traces[(batch_size, num_tokens)] = traced
+
+    def __call__(self, input_ids, attention_mask, **kwargs):
+        # A trace bakes in the padding layout of its example, so only fully
+        # unpadded batches can safely reuse one
+        traced = self.traces.get(tuple(input_ids.shape)) if bool(attention_mask.all()) else None
+        if traced is not None:
+            return (traced(input_ids, attention_mask),)
+        return self.eager_model(input_ids=input_ids, attention_mask=attention_mask, **kwargs)
+
+    def get_input_embeddings(self):
+        return self.eager_model.get_input_embeddings()
+
+if USE_TORCHSCRIPT and not using_onnx and not TORCH_COMPILE:
+    try:
+        print("Tracing model with TorchScript...")
+        enable_plain_index_ops(model)
+        # The single sequence and the 3-alternate batch at each common token count
+        model = TracedEncoder(model, [(batch_size, num_tokens) for batch_size in (1, 3)
+                                      for num_tokens in TRACED_TOKEN_COUNTS])
+        print(f"TorchScript enabled for {len(model.traces)} input shapes!")
+    except Exception as e:
+        print(f"TorchScript tracing failed, using eager model: {e}")
+
+if TORCH_COMPILE and not using_onnx:
+    eager_model = model
+    try:
+        print("Compiling model with torch.compile...")
+        import torch._inductor.config as inductor_config
+        inductor_config.cpp.threads = torch.get_num_threads()
+        # Token counts vary per input and DNABERT-2 unpads by mask, so a static graph
+        # per shape would hit dynamo's recompile limit; compile with dynamic shapes
+        model = torch.compile(eager_model, dynamic=True)
+        # Warm up every shape /predict uses (single sequence and the 3-alternate batch,
+        # at each token count a 20-nt input can produce, padded and unpadded) so
+        # compilation happens before the server accepts traffic. The dynamic graphs also
+        # serve the micro-batcher's larger merged batches without compiling new ones
+        for batch_size in (1, 3):
+            for num_tokens in range(3, MAX_SEQUENCE_TOKENS + 1):
+                inputs = warmup_inputs(batch_size, num_tokens)
+                run_encoder(inputs)
+                if batch_size > 1:
+                    inputs["attention_mask"][-1, -1] = 0
+                    run_encoder(inputs)
+        print("Model compiled!")
+    except Exception as e:
+        model = eager_model
+        print(f"torch.compile failed, using eager model: {e}")
+
+class EncoderBatcher:
+    """Coalesces concurrent encoder calls from request threads into one padded forward"""
+
+    def __init__(self, max_batch, timeout_ms):
+        self.max_batch = max_batch
+        self.timeout = timeout_ms / 1000
+        self._start()
+        # Threads don't survive fork, so gunicorn --preload workers need their own
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self.requests = collections.deque()
+        self.active_requests = 0
+        self.condition = threading.Condition()
+        threading.Thread(target=self._worker, name="encoder-batcher", daemon=True).start()
+
+    @contextlib.contextmanager
+    def track_request(self):
+        # Marks a /predict request as in progress, so the worker knows more encoder
+        # calls may be about to arrive and it is worth waiting for them
+        with self.condition:
+            self.active_requests += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active_requests -= 1
+                self.condition.notify()
+
+    def encode(self, sequences):
+        # Blocks until the batch containing these sequences has been run; returns
+        # hidden states and attention mask trimmed to this call's own padding width
+        future = Future()
+        with self.condition:
+            self.requests.append((sequences, future))
+            self.condition.notify()
+        return future.result()
+
+    def _collect(self):
+        with self.condition:
+            self.condition.wait_for(lambda: self.requests)
+            pending = [self.requests.popleft()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.timeout
+            while size < self.max_batch:
+                if self.requests:
+                    # Leave a call that would overflow MAX_BATCH queued for the next batch
+                    if size + len(self.requests[0][0]) > self.max_batch:
+                        break
+                    item = self.requests.popleft()
+                    pending.append(item)
+                    size += len(item[0])
+                    continue
+                # Each request has at most one encoder call outstanding, so once every
+                # in-progress request is represented nothing else can join: dispatch now
+                remaining = deadline - time.monotonic()
+                if len(pending) >= self.active_requests or remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return pending
+
+    def _worker(self):
+        while True:
+            pending = self._collect()
+            try:
+                inputs = tokenize_batch([seq for sequences, _ in pending for seq in sequences])
+                hidden_states = run_encoder(inputs)
+                start = 0
+                for sequences, future in pending:
+                    end = start + len(sequences)
+                    mask = inputs["attention_mask"][start:end]
+                    width = int(mask.sum(dim=1).max())
+                    future.set_result((hidden_states[start:end, :width], mask[:, :width]))
+                    start = end
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+
+encoder_batcher = EncoderBatcher(MAX_BATCH, BATCH_TIMEOUT_MS) if MAX_BATCH > 1 else None
 
 # Helper functions
+def encode_sequences(sequences):
+    # Returns [B, T, H] hidden states plus the matching [B, T] attention mask
+    if encoder_batcher is not None:
+        return encoder_batcher.encode(sequences)
+    inputs = tokenize_batch(sequences)
+    return run_encoder(inputs), inputs["attention_mask"]
+
+def track_request():
+    # Lets the encoder batcher see concurrent /predict requests; a no-op without it
+    if encoder_batcher is not None:
+        return encoder_batcher.track_request()
+    return contextlib.nullcontext()
+
+# The same 20-nt strings get re-encoded several times per request, so cache by sequence.
+# Callers share the cached tensor and must not modify it in place.
+@functools.lru_cache(maxsize=4096)
+def _embed_cached(sequence):
+    hidden_states, _ = encode_sequences([sequence])
+    # Clone rather than .contiguous(): a batcher slice is already contiguous, and the
+    # view would keep the whole micro-batch's storage alive for the life of the entry
+    return hidden_states.squeeze(0).detach().clone()
+
 def get_token_embeddings(sequence):
-    inputs = tokenizer(sequence, return_tensors="pt", truncation=True, padding=True, max_length=512)
-    
-    with torch.no_grad():
-        outputs = model(**inputs)
-    
-    # Handle different output formats using the same approach as in run_dnabert.py
-    if isinstance(outputs, tuple):
-        hidden_states = outputs[0]
-    elif hasattr(outputs, 'last_hidden_state'):
-        hidden_states = outputs.last_hidden_state
-    else:
-        hidden_states = outputs
-    
-    return hidden_states.squeeze(0)
+    return _embed_cached(sequence)
 
 def generate_reference_token_embedding(sequences):
-    all_token_embeds = []
-    max_len = 0
-    for seq in sequences:
-        token_embed = get_token_embeddings(seq)
-        all_token_embeds.append(token_embed)
-        max_len = max(max_len, token_embed.size(0))
-
-    padded_embeds = []
-    for emb in all_token_embeds:
-        pad_size = max_len - emb.size(0)
-        if pad_size > 0:
-            emb = torch.cat([emb, torch.zeros(pad_size, emb.size(1), device=device)], dim=0)
-        padded_embeds.append(emb)
-
-    return torch.stack(padded_embeds).mean(dim=0)
-
-def find_problematic_position(token_embeddings, reference_embeddings):
-    cos = torch.nn.CosineSimilarity(dim=1)
-    similarities = cos(token_embeddings, reference_embeddings[:token_embeddings.size(0)])
+    # One batched forward for all references; padded positions are zeroed so the
+    # per-token mean matches zero-padding each sequence to the longest one
+    hidden_states, attention_mask = encode_sequences(sequences)
+    mask = attention_mask.unsqueeze(-1).to(hidden_states.dtype)
+    return (hidden_states * mask).mean(dim=0)
+
+def find_problematic_position(token_embeddings, reference_norm_by_len):
+    # Reference rows are unit length, so per-token cosine is a row-wise dot product.
+    # Tokens past the end of the reference have nothing to compare against, so inputs
+    # that tokenize longer than it are scored on the overlapping prefix only
+    reference_norm = reference_norm_by_len[token_embeddings.size(0)]
+    token_norm = torch.nn.functional.normalize(token_embeddings[:reference_norm.size(0)], dim=1)
+    similarities = (token_norm * reference_norm).sum(dim=-1)
     return torch.argmin(similarities).item()
 
-def choose_best_alternate_base(seq, idx, reference_token_embeddings):
-    best_base = None
-    best_score = -1
+def score_against_reference(sequence_embeds, reference_mean):
+    # reference_mean is pre-normalized, so cosine similarity for the whole batch is one GEMM
+    return torch.mm(torch.nn.functional.normalize(sequence_embeds, dim=1), reference_mean.T).squeeze(1)
+
+def masked_mean(hidden_states, attention_mask):
+    # Mean over real tokens only so padding doesn't skew shorter tokenizations.
+    # [B, 1, T] x [B, T, H] reduces in one batched GEMM without a masked copy of the states
+    mask = attention_mask.to(hidden_states.dtype)
+    return torch.bmm(mask.unsqueeze(1), hidden_states).squeeze(1) / mask.sum(dim=1, keepdim=True)
+
+def pooled_embed(sequences):
+    # [B, H] sequence embeddings straight from one encoder pass
+    hidden_states, attention_mask = encode_sequences(sequences)
+    return masked_mean(hidden_states, attention_mask)
+
+def get_input_space_embeddings(sequences):
+    # Pooled word embeddings straight from the embedding table, no transformer layers
+    inputs = tokenize_batch(sequences)
+    return masked_mean(EMBED_MATRIX[inputs["input_ids"]], inputs["attention_mask"])
+
+def choose_best_alternate_base(seq, idx, reference_mean):
     original_base = seq[idx]
+    alt_bases = [b for b in BASES if b != original_base]
+    alt_seqs = [seq[:idx] + base + seq[idx + 1:] for base in alt_bases]
+
+    if FAST_EDIT_SCORING:
+        # Approximate ranking in embedding space, then score only the winner with the
+        # encoder so the result stays comparable with the original sequence's score
+        approx_scores = score_against_reference(get_input_space_embeddings(alt_seqs), REFERENCE_INPUT_MEAN)
+        best = torch.argmax(approx_scores).item()
+        return alt_bases[best], score_against_reference(pooled_embed([alt_seqs[best]]), reference_mean).item()
 
-    for base in [b for b in BASES if b != original_base]:
-        new_seq = seq[:idx] + base + seq[idx + 1:]
-        token_embeds = get_token_embeddings(new_seq)
-        sequence_embed = token_embeds.mean(dim=0).unsqueeze(0)
-        reference_mean = reference_token_embeddings.mean(dim=0).unsqueeze(0)
-        score = torch.cosine_similarity(sequence_embed, reference_mean).item()
-        if score > best_score:
-            best_score = score
-            best_base = base
-
-    return best_base, best_score
-
-def get_sequence_score(seq, reference_token_embeddings):
-    token_embeds = get_token_embeddings(seq)
-    sequence_embed = token_embeds.mean(dim=0).unsqueeze(0)
-    reference_mean = reference_token_embeddings.mean(dim=0).unsqueeze(0)
-    return torch.cosine_similarity(sequence_embed, reference_mean).item()
-
-def predict_edit(seq, reference_token_embeddings):
-    token_embeds = get_token_embeddings(seq)
-    problem_idx = find_problematic_position(token_embeds, reference_token_embeddings)
-    new_base, edited_score = choose_best_alternate_base(seq, problem_idx, reference_token_embeddings)
+    # Score all alternates in a single batched forward instead of one per base
+    scores = score_against_reference(pooled_embed(alt_seqs), reference_mean)
+    best = torch.argmax(scores).item()
+    return alt_bases[best], scores[best].item()
+
+def get_sequence_score(token_embeds, reference_mean):
+    sequence_embed = token_embeds.mean(dim=0, keepdim=True)
+    return score_against_reference(sequence_embed, reference_mean).item()
+
+def predict_edit(seq, token_embeds, reference_norm_by_len, reference_mean):
+    problem_idx = find_problematic_position(token_embeds, reference_norm_by_len)
+    new_base, edited_score = choose_best_alternate_base(seq, problem_idx, reference_mean)
     edited_seq = seq[:problem_idx] + new_base + seq[problem_idx + 1:]
     return edited_seq, problem_idx, new_base, edited_score
 
@@ -168,14 +564,36 @@ REFERENCE_SEQUENCES = [
 # Initialize reference embeddings
 print("Generating reference embeddings...")
 REFERENCE_EMBEDDINGS = generate_reference_token_embedding(REFERENCE_SEQUENCES)
+# Per-token reference, L2-normalized once for find_problematic_position
+REFERENCE_NORM = torch.nn.functional.normalize(REFERENCE_EMBEDDINGS, dim=1).contiguous()
+# 20-nt inputs only ever tokenize to a few lengths, so keep a contiguous prefix per length,
+# covering lengths beyond the reference's own (those get the whole reference)
+REFERENCE_NORM_BY_LEN = {
+    length: REFERENCE_NORM[:length].contiguous() for length in range(1, MAX_SEQUENCE_TOKENS + 1)
+}
+# The reference never changes, so pool and L2-normalize it once instead of per call
+REFERENCE_MEAN = torch.nn.functional.normalize(
+    REFERENCE_EMBEDDINGS.mean(dim=0, keepdim=True), dim=1
+).contiguous()
+# Embedding-space counterparts used by FAST_EDIT_SCORING; skipped otherwise, since
+# .float() copies the whole word-embedding table when the model runs in BF16
+EMBED_MATRIX = None
+REFERENCE_INPUT_MEAN = None
+if FAST_EDIT_SCORING:
+    EMBED_MATRIX = model.get_input_embeddings().weight.float()
+    REFERENCE_INPUT_MEAN = torch.nn.functional.normalize(
+        get_input_space_embeddings(REFERENCE_SEQUENCES).mean(dim=0, keepdim=True), dim=1
+    )
 print("Reference embeddings ready!")
 
 # Pydantic model for request validation
 class DNASequence(BaseModel):
     sequence: str
 
+# Plain def so FastAPI runs requests on its threadpool, letting concurrent
+# requests meet in the encoder batcher instead of queueing on the event loop
 @app.post("/predict")
-async def predict_sequence(data: DNASequence):
+def predict_sequence(data: DNASequence):
     try:
         sequence = data.sequence.upper()
         
@@ -192,8 +610,14 @@ async def predict_sequence(data: DNASequence):
                 content={"error": "Sequence must contain only A, T, C, G"}
             )
 
-        original_score = get_sequence_score(sequence, REFERENCE_EMBEDDINGS)
-        edited_seq, index, base, edited_score = predict_edit(sequence, REFERENCE_EMBEDDINGS)
+        # One forward for the original feeds both its score and the edit position;
+        # the alternates then share a single batched forward
+        with track_request():
+            token_embeds = get_token_embeddings(sequence)
+            original_score = get_sequence_score(token_embeds, REFERENCE_MEAN)
+            edited_seq, index, base, edited_score = predict_edit(
+                sequence, token_embeds, REFERENCE_NORM_BY_LEN, REFERENCE_MEAN
+            )
         
         # Convert score to percentage for the app
         efficiency = int(edited_score * 100)
@@ -234,5 +658,8 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 if __name__ == "__main__":
+    # Single-process development server. For production run_server.sh starts gunicorn with
+    # --preload so the model is loaded once and shared copy-on-write by forked workers:
+    #   WORKERS=4 gunicorn -k uvicorn.workers.UvicornWorker -w 4 --preload -b 0.0.0.0:4000 app:app
     import uvicorn
     uvicorn.run("app:app", host="0.0.0.0", port=4000, reload=True)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+DNABERT-2 ONNX Export
+
+Offline build step for serving the predictor with ONNX Runtime. Loads the model
+exactly as app.py does, exports the encoder to ONNX with dynamic batch and
+sequence axes, then writes a dynamically INT8-quantized copy next to it.
+
+Start the server against the quantized model with:
+    ONNX_MODEL_PATH=dnabert2.int8.onnx python app.py
+
+Dependencies (in addition to requirements.txt):
+- onnx
+- onnxscript
+- onnxruntime
+"""
+
+import os
+
+# Export the plain FP32 PyTorch model; app.py's optional backends stay off and
+# MAX_BATCH=1 keeps it from starting the encoder batcher thread
+os.environ["QUANTIZE_INT8"] = "0"
+os.environ["TORCH_COMPILE"] = "0"
+os.environ["ONNX_MODEL_PATH"] = ""
+os.environ["USE_BF16"] = "0"
+os.environ["USE_IPEX"] = "0"
+os.environ["USE_TORCHSCRIPT"] = "0"
+os.environ["MAX_BATCH"] = "1"
+
+import onnx
+import torch
+from onnxruntime.quantization import quantize_dynamic, QuantType
+
+import app
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ONNX_PATH = os.path.join(SCRIPT_DIR, "dnabert2.onnx")
+INT8_ONNX_PATH = os.path.join(SCRIPT_DIR, "dnabert2.int8.onnx")
+
+
+class EncoderWrapper(torch.nn.Module):
+    """Exposes just (input_ids, attention_mask) -> last hidden state for export"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        outputs = self.model(input_ids=input_ids, attention_mask=attention_mask)
+        return app.extract_hidden_states(outputs)
+
+
+def main():
+    example = app.tokenizer(["ACGT" * 5] * 3, return_tensors="pt", padding=True)
+    batch = torch.export.Dim("batch")
+    tokens = torch.export.Dim("tokens", max=512)
+
+    # DNABERT-2 unpads by attention mask, which needs the dynamo exporter to keep
+    # the token axis dynamic
+    print(f"Exporting model to {ONNX_PATH}...")
+    torch.onnx.export(
+        EncoderWrapper(app.model),
+        (example["input_ids"], example["attention_mask"]),
+        ONNX_PATH,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["last_hidden_state"],
+        opset_version=17,
+        dynamo=True,
+        dynamic_shapes={
+            "input_ids": {0: batch, 1: tokens},
+            "attention_mask": {0: batch, 1: tokens},
+        },
+    )
+
+    # The exporter's value_info annotations trip the quantizer's shape
+    # inference, so drop them and let it re-infer
+    exported = onnx.load(ONNX_PATH)
+    del exported.graph.value_info[:]
+    weights_file = os.path.basename(ONNX_PATH) + ".data"
+    os.remove(os.path.join(SCRIPT_DIR, weights_file))  # onnx appends to an existing file
+    onnx.save(exported, ONNX_PATH, save_as_external_data=True, location=weights_file)
+
+    print(f"Quantizing to {INT8_ONNX_PATH}...")
+    quantize_dynamic(ONNX_PATH, INT8_ONNX_PATH, weight_type=QuantType.QInt8)
+    print("Export complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Gunicorn settings for the predictor
+
+Loaded by run_server.sh and without_venv.sh. With several workers, app.py leaves
+OpenMP thread binding off (under --preload it would tie every worker to the
+master's core), so each forked worker is pinned to its own CPU core here instead.
+"""
+
+import os
+
+
+def post_fork(server, worker):
+    # A single worker keeps app.py's multi-threaded OpenMP binding
+    if server.cfg.workers < 2 or not hasattr(os, "sched_setaffinity"):
+        return
+    # One core per worker, cycling through the cores this process may use (e.g. the
+    # NUMA node numactl bound the master to) when there are more workers than cores
+    cores = sorted(os.sched_getaffinity(0))
+    core = cores[(worker.age - 1) % len(cores)]
+    # The affinity mask is per thread and the encoder batcher thread is already
+    # running (it restarts at fork), so pin every thread of the worker
+    for thread_id in os.listdir("/proc/self/task"):
+        os.sched_setaffinity(int(thread_id), {core})
+    server.log.info(f"Worker {worker.pid} pinned to CPU {core}")
@@ -28,7 +28,7 @@ if [ "$CREATE_ENV" = true ]; then
     echo "Installing CPU-only dependencies..."
     pip install --upgrade pip
     pip install torch==2.7.0
-    pip install transformers==4.51.3 protobuf==6.30.2 einops==0.8.1 accelerate==1.6.0 fastapi==0.115.12 uvicorn==0.34.2 numpy==2.2.5
+    pip install transformers==4.51.3 protobuf==6.30.2 einops==0.8.1 accelerate==1.6.0 fastapi==0.115.12 uvicorn==0.34.2 gunicorn==23.0.0 numpy==2.2.5
 
     # Save dependencies to requirements.txt
     cat > "$SCRIPT_DIR/requirements.txt" << EOL
@@ -39,6 +39,7 @@ einops==0.8.1
 accelerate==1.6.0
 fastapi==0.115.12
 uvicorn==0.34.2
+gunicorn==23.0.0
 numpy==2.2.5
 EOL
 
@@ -57,6 +58,9 @@ export USE_TORCH=1
 export USE_CUDA=0
 export USE_TRITON=0
 
+# Number of worker processes; the model is loaded once and shared copy-on-write
+export WORKERS="${WORKERS:-4}"
+
 # Start server
 echo ""
 echo "========== Starting DNA Sequence Prediction Server =========="
@@ -69,4 +73,11 @@ echo "==========================================================="
 echo ""
 
 cd "$SCRIPT_DIR"
-python app.py
+# --preload loads the model in the master before forking the workers;
+# gunicorn.conf.py pins each worker to its own CPU core
+SERVER_CMD=(gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker -w "$WORKERS" --preload -b 0.0.0.0:4000 app:app)
+# On multi-socket machines, keep threads and memory on one NUMA node if numactl is available
+if command -v numactl &> /dev/null && [ "$(numactl --hardware | awk '/available:/ {print $2}')" -gt 1 ]; then
+    exec numactl --cpunodebind=0 --membind=0 "${SERVER_CMD[@]}"
+fi
+exec "${SERVER_CMD[@]}"
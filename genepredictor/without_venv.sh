@@ -23,6 +23,7 @@ python3 -m pip install transformers==4.35.2 \
     accelerate==0.25.0 \
     fastapi==0.109.0 \
     uvicorn==0.27.0 \
+    gunicorn==21.2.0 \
     numpy==1.26.3
 
 # Set environment variables to ensure CPU-only usage
@@ -31,6 +32,9 @@ export USE_TORCH=1
 export USE_CUDA=0
 export USE_TRITON=0
 
+# Number of worker processes; the model is loaded once and shared copy-on-write
+export WORKERS="${WORKERS:-4}"
+
 # Inform the user
 echo ""
 echo "========== Starting DNA Sequence Prediction Server =========="
@@ -45,4 +49,4 @@ echo ""
 
 # Run the FastAPI server
 cd "$SCRIPT_DIR"
-exec python3 app.py
\ No newline at end of file
+exec python3 -m gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker -w "$WORKERS" --preload -b 0.0.0.0:4000 app:app
\ No newline at end of file